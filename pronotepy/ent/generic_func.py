@@ -1,18 +1,141 @@
-from logging import getLogger, DEBUG
+from logging import getLogger
+from types import MappingProxyType
 import typing
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, Tag
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin, urlparse, urlunparse
 
 from ..exceptions import *
 
 log = getLogger(__name__)
-log.setLevel(DEBUG)
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:73.0) Gecko/20100101 Firefox/73.0"
-}
+# read-only, copied once into each session by _session()
+HEADERS = MappingProxyType(
+    {
+        "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:73.0) Gecko/20100101 Firefox/73.0"
+    }
+)
+
+# shared between every ENT login so connections to the same hosts are kept alive,
+# idempotent GETs are retried on the same pool instead of failing the whole login
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    ),
+)
+
+
+def _session() -> requests.Session:
+    """
+    Create a session using the shared connection pool
+
+    Returns
+    -------
+    session : requests.Session
+        a new session with the default headers and the shared adapter mounted
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", _ADAPTER)
+    session.mount("http://", _ADAPTER)
+    return session
+
+
+def _soup(response: requests.Response) -> BeautifulSoup:
+    """
+    Parse the html of a response, once per response
+
+    Parameters
+    ----------
+    response : requests.Response
+        response of an html page
+
+    Returns
+    -------
+    soup : BeautifulSoup
+        the parsed page, cached on the response
+    """
+    soup = getattr(response, "_soup", None)
+    if soup is None:
+        soup = BeautifulSoup(response.content, "lxml")
+        setattr(response, "_soup", soup)
+    return soup
+
+
+def _find_inputs(response: requests.Response, *names: str) -> typing.Dict[str, Tag]:
+    """
+    Find the inputs of a page with any of the given names in a single lookup
+
+    Parameters
+    ----------
+    response : requests.Response
+        response of an html page
+    *names : str
+        names of the inputs
+
+    Returns
+    -------
+    inputs : dict
+        names mapped to the first input with that name, missing names are left out
+    """
+    inputs: typing.Dict[str, Tag] = {}
+    for input_ in _soup(response).find_all("input", {"name": list(names)}):
+        if isinstance(input_, Tag):
+            inputs.setdefault(str(input_["name"]), input_)
+    return inputs
+
+
+def _form_action(response: requests.Response) -> str:
+    """
+    Get the action of the first form of a page
+
+    Parameters
+    ----------
+    response : requests.Response
+        response of an html page
+
+    Returns
+    -------
+    action : str
+        the action attribute of the form
+    """
+    form = typing.cast(Tag, _soup(response).find("form"))
+    return str(form["action"])
+
+
+def _form_payload(form: Tag) -> typing.Dict[str, typing.Optional[str]]:
+    """
+    Collect the named inputs of a form
+
+    Parameters
+    ----------
+    form : Tag
+        the form element
+
+    Returns
+    -------
+    payload : dict
+        input names mapped to their value, or None for inputs without one
+    """
+    payload: typing.Dict[str, typing.Optional[str]] = {}
+    for input_ in form.descendants:
+        if not isinstance(input_, Tag) or input_.name != "input":
+            continue
+        name = input_.get("name")
+        if name and isinstance(name, str):
+            value = input_.get("value")
+            payload[name] = value if value is None else str(value)
+    return payload
 
 
 @typing.no_type_check
@@ -43,19 +166,21 @@ def _educonnect(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[EduConnect {url}] Logging in with {username}")
+    log.debug("[EduConnect %s] Logging in with %s", url, username)
 
     payload = {"j_username": username, "j_password": password, "_eventId_proceed": ""}
-    response = session.post(url, headers=HEADERS, data=payload)
+    response = session.post(url, data=payload)
     # 2nd SAML Authentication
-    soup = BeautifulSoup(response.text, "html.parser")
-    input_SAMLResponse = soup.find("input", {"name": "SAMLResponse"})
-    if not input_SAMLResponse and response.status_code == 200 and url != response.url:
+    inputs = _find_inputs(response, "SAMLResponse", "RelayState")
+    if (
+        "SAMLResponse" not in inputs
+        and response.status_code == 200
+        and url != response.url
+    ):
         # manual redirect
-        response = session.post(response.url, headers=HEADERS, data=payload)
-        soup = BeautifulSoup(response.text, "html.parser")
-        input_SAMLResponse = soup.find("input", {"name": "SAMLResponse"})
-    if not input_SAMLResponse:
+        response = session.post(response.url, data=payload)
+        inputs = _find_inputs(response, "SAMLResponse", "RelayState")
+    if "SAMLResponse" not in inputs:
         if exceptions:
             raise ENTLoginError(
                 "Fail to connect with EduConnect : probably wrong login information"
@@ -63,15 +188,9 @@ def _educonnect(
         else:
             return None
 
-    payload = {
-        "SAMLResponse": input_SAMLResponse["value"],
-    }
-
-    input_relayState = soup.find("input", {"name": "RelayState"})
-    if input_relayState:
-        payload["RelayState"] = input_relayState["value"]
+    payload = {name: input_["value"] for name, input_ in inputs.items()}
 
-    return session.post(soup.find("form")["action"], headers=HEADERS, data=payload)
+    return session.post(_form_action(response), data=payload)
 
 
 @typing.no_type_check
@@ -100,31 +219,22 @@ def _cas_edu(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[ENT {url}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", url, username)
 
     # ENT Connection
-    with requests.Session() as session:
-        response = session.get(url, headers=HEADERS)
-
-        if redirect_form:
-            soup = BeautifulSoup(response.text, "html.parser")
-            input_SAMLRequest = soup.find("input", {"name": "SAMLRequest"})
-            if input_SAMLRequest:
-                payload = {
-                    "SAMLRequest": input_SAMLRequest["value"],
-                }
+    session = _session()
+    response = session.get(url)
 
-                input_relayState = soup.find("input", {"name": "RelayState"})
-                if input_relayState:
-                    payload["RelayState"] = input_relayState["value"]
+    if redirect_form:
+        inputs = _find_inputs(response, "SAMLRequest", "RelayState")
+        if "SAMLRequest" in inputs:
+            payload = {name: input_["value"] for name, input_ in inputs.items()}
 
-                response = session.post(
-                    soup.find("form")["action"], data=payload, headers=HEADERS
-                )
+            response = session.post(_form_action(response), data=payload)
 
-        _educonnect(session, username, password, response.url)
+    _educonnect(session, username, password, response.url)
 
-        return session.cookies
+    return session.cookies
 
 
 @typing.no_type_check
@@ -151,29 +261,27 @@ def _cas(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[ENT {url}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", url, username)
 
     # ENT Connection
-    with requests.Session() as session:
-        response = session.get(url, headers=HEADERS)
+    session = _session()
+    response = session.get(url)
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        form = soup.find("form", {"class": "cas__login-form"})
-        payload = {}
-        for input_ in form.findAll("input"):
-            payload[input_["name"]] = input_.get("value")
-        payload["username"] = username
-        payload["password"] = password
+    soup = _soup(response)
+    form = soup.find("form", {"class": "cas__login-form"})
+    payload = _form_payload(form)
+    payload["username"] = username
+    payload["password"] = password
 
-        r = session.post(response.url, data=payload, headers=HEADERS)
-        soup = BeautifulSoup(r.text, "html.parser")
+    r = session.post(response.url, data=payload)
+    soup = _soup(r)
 
-        if soup.find("form", {"class": "cas__login-form"}):
-            raise ENTLoginError(
-                f"Fail to connect with CAS {url} : probably wrong login information"
-            )
+    if soup.find("form", {"class": "cas__login-form"}):
+        raise ENTLoginError(
+            f"Fail to connect with CAS {url} : probably wrong login information"
+        )
 
-        return session.cookies
+    return session.cookies
 
 
 def _open_ent_ng(
@@ -199,19 +307,19 @@ def _open_ent_ng(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[ENT {url}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", url, username)
 
     # ENT Connection
-    with requests.Session() as session:
-        payload = {"email": username, "password": password}
-        r = session.post(url, headers=HEADERS, data=payload)
+    session = _session()
+    payload = {"email": username, "password": password}
+    r = session.post(url, data=payload)
 
-        if "login" in r.url:
-            raise ENTLoginError(
-                f"Fail to connect with Open NG {url} : probably wrong login information"
-            )
+    if "login" in r.url:
+        raise ENTLoginError(
+            f"Fail to connect with Open NG {url} : probably wrong login information"
+        )
 
-        return session.cookies
+    return session.cookies
 
 
 def _open_ent_ng_edu(
@@ -239,30 +347,28 @@ def _open_ent_ng_edu(
     if not providerId:
         providerId = f"{domain}/auth/saml/metadata/idp.xml"
 
-    log.debug(f"[ENT {domain}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", domain, username)
 
     # URL required
     ent_login_page = (
         "https://educonnect.education.gouv.fr/idp/profile/SAML2/Unsolicited/SSO"
     )
 
-    with requests.Session() as session:
-        params = {"providerId": providerId}
+    session = _session()
+    params = {"providerId": providerId}
 
-        response = session.get(ent_login_page, params=params, headers=HEADERS)
-        response = _educonnect(
-            session, username, password, response.url, exceptions=False
-        )
+    response = session.get(ent_login_page, params=params)
+    response = _educonnect(session, username, password, response.url, exceptions=False)
 
-        if not response:
-            log.debug(f"Fail to connect with EduConnect, trying with Open NG")
-            return _open_ent_ng(username, password, f"{domain}/auth/login")
+    if not response:
+        log.debug("Fail to connect with EduConnect, trying with Open NG")
+        return _open_ent_ng(username, password, f"{domain}/auth/login")
 
-        elif "login" in response.url:
-            log.debug(f"Fail to connect with EduConnect, trying with Open NG")
-            return _open_ent_ng(username, password, response.url)
+    elif "login" in response.url:
+        log.debug("Fail to connect with EduConnect, trying with Open NG")
+        return _open_ent_ng(username, password, response.url)
 
-        return session.cookies
+    return session.cookies
 
 
 @typing.no_type_check
@@ -304,36 +410,34 @@ def _wayf(
     if not returnX:
         returnX = f"{domain}/Shibboleth.sso/Login"
 
-    log.debug(f"[ENT {domain}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", domain, username)
 
     ent_login_page = f"{domain}/discovery/WAYF"
 
     # ENT Connection
-    with requests.Session() as session:
-        params = {
-            "entityID": entityID,
-            "returnX": returnX,
-            "returnIDParam": "entityID",
-            "action": "selection",
-            "origin": "https://educonnect.education.gouv.fr/idp",
-        }
+    session = _session()
+    params = {
+        "entityID": entityID,
+        "returnX": returnX,
+        "returnIDParam": "entityID",
+        "action": "selection",
+        "origin": "https://educonnect.education.gouv.fr/idp",
+    }
 
-        response = session.get(ent_login_page, params=params, headers=HEADERS)
+    response = session.get(ent_login_page, params=params)
 
-        if redirect_form:
-            soup = BeautifulSoup(response.text, "html.parser")
-            payload = {
-                "RelayState": soup.find("input", {"name": "RelayState"})["value"],
-                "SAMLRequest": soup.find("input", {"name": "SAMLRequest"})["value"],
-            }
+    if redirect_form:
+        inputs = _find_inputs(response, "RelayState", "SAMLRequest")
+        payload = {
+            "RelayState": inputs["RelayState"]["value"],
+            "SAMLRequest": inputs["SAMLRequest"]["value"],
+        }
 
-            response = session.post(
-                soup.find("form")["action"], data=payload, headers=HEADERS
-            )
+        response = session.post(_form_action(response), data=payload)
 
-        _educonnect(session, username, password, response.url)
+    _educonnect(session, username, password, response.url)
 
-        return session.cookies
+    return session.cookies
 
 
 @typing.no_type_check
@@ -360,61 +464,58 @@ def _oze_ent(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[ENT {url}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", url, username)
 
     # ENT Connection
-    with requests.Session() as session:
-        response = session.get(url, headers=HEADERS)
-
-        domain = urlparse(url).netloc
+    session = _session()
+    response = session.get(url)
 
-        if domain not in username:
-            username = f"{username}@{domain}"
+    parsed_url = urlparse(url)
+    domain = parsed_url.netloc
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        form = soup.find("form", {"id": "auth_form"})
-        payload = {}
-        for input_ in form.findAll("input"):
-            payload[input_["name"]] = input_.get("value")
-        payload["username"] = username
-        payload["password"] = password
+    if domain not in username:
+        username = f"{username}@{domain}"
 
-        r = session.post(response.url, data=payload, headers=HEADERS)
+    soup = _soup(response)
+    form = soup.find("form", {"id": "auth_form"})
+    payload = _form_payload(form)
+    payload["username"] = username
+    payload["password"] = password
 
-        if "auth_form" in r.text:
-            raise ENTLoginError(
-                f"Fail to connect with Oze ENT {url} : probably wrong login information"
-            )
+    r = session.post(response.url, data=payload)
 
-        # Compute the Oze API url
-        api_url = urlunparse(
-            urlparse(url)._replace(netloc="api-" + urlparse(url).netloc)
+    if b"auth_form" in r.content:
+        raise ENTLoginError(
+            f"Fail to connect with Oze ENT {url} : probably wrong login information"
         )
 
-        # Get mandatory user info for next call
-        info_url = urljoin(api_url, "/v1/users/me")
-        r = session.get(info_url, headers=HEADERS)
-        info = r.json()
-        ctx_profil = info["currentProfil"]["codeProfil"]
-        ctx_etab = info["currentProfil"]["uai"]
+    # Compute the Oze API url
+    api_url = urlunparse(parsed_url._replace(netloc="api-" + domain))
 
-        # Get info about Oze apps
-        ozeapps_url = urljoin(api_url, "/v1/ozapps")
-        payload = {}
-        payload["ctx_profil"] = ctx_profil
-        payload["ctx_etab"] = ctx_etab
-        r = session.get(ozeapps_url, params=payload, headers=HEADERS)
+    # Get mandatory user info for next call
+    info_url = urljoin(api_url, "/v1/users/me")
+    r = session.get(info_url)
+    info = r.json()
+    ctx_profil = info["currentProfil"]["codeProfil"]
+    ctx_etab = info["currentProfil"]["uai"]
 
-        # Find proxySSO url for Pronote app and call it
-        ozeapps = r.json()
-        proxysso_url = None
-        for app in ozeapps:
-            if app["code"] == "pronote":
-                proxysso_url = urljoin(url, app["externalRoute"])
+    # Get info about Oze apps
+    ozeapps_url = urljoin(api_url, "/v1/ozapps")
+    payload = {}
+    payload["ctx_profil"] = ctx_profil
+    payload["ctx_etab"] = ctx_etab
+    r = session.get(ozeapps_url, params=payload)
 
-        r = session.get(proxysso_url, headers=HEADERS)
+    # Find proxySSO url for Pronote app and call it
+    ozeapps = r.json()
+    proxysso_url = None
+    for app in ozeapps:
+        if app["code"] == "pronote":
+            proxysso_url = urljoin(url, app["externalRoute"])
 
-        return session.cookies
+    r = session.get(proxysso_url)
+
+    return session.cookies
 
 
 @typing.no_type_check
@@ -443,26 +544,24 @@ def _simple_auth(
     if not url:
         raise ENTLoginError("Missing url attribute")
 
-    log.debug(f"[ENT {url}] Logging in with {username}")
+    log.debug("[ENT %s] Logging in with %s", url, username)
 
     # ENT Connection
-    with requests.Session() as session:
-        response = session.get(url, headers=HEADERS)
+    session = _session()
+    response = session.get(url)
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        form = soup.find("form", form_attr)
-        payload = {}
-        for input_ in form.findAll("input"):
-            payload[input_["name"]] = input_.get("value")
-        payload["username"] = username
-        payload["password"] = password
+    soup = _soup(response)
+    form = soup.find("form", form_attr)
+    payload = _form_payload(form)
+    payload["username"] = username
+    payload["password"] = password
 
-        r = session.post(response.url, data=payload, headers=HEADERS)
-        soup = BeautifulSoup(r.text, "html.parser")
+    r = session.post(response.url, data=payload)
+    soup = _soup(r)
 
-        if soup.find("form", form_attr):
-            raise ENTLoginError(
-                f"Fail to connect with {url} : probably wrong login information"
-            )
+    if soup.find("form", form_attr):
+        raise ENTLoginError(
+            f"Fail to connect with {url} : probably wrong login information"
+        )
 
-        return session.cookies
+    return session.cookies
@@ -5,8 +5,16 @@ from functools import partial
 
 import pronotepy
 from pronotepy import ent
+from pronotepy.ent.generic_func import (
+    _ADAPTER,
+    _find_inputs,
+    _form_action,
+    _form_payload,
+    _soup,
+)
 import logging
 import requests
+from bs4 import Tag
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
@@ -33,6 +41,59 @@ class TestENT(unittest.TestCase):
                     )
 
 
+def _response(html: bytes, content_type: str = "text/html") -> requests.Response:
+    response = requests.Response()
+    response._content = html
+    response.headers["Content-Type"] = content_type
+    return response
+
+
+class TestGenericFunc(unittest.TestCase):
+    def test_form_payload(self) -> None:
+        response = _response(
+            b'<form><input name="a" value="1"><div><input name="b"></div>'
+            b'<input type="submit" value="ok"></form><input name="c" value="3">'
+        )
+        form = _soup(response).find("form")
+        assert isinstance(form, Tag)
+        self.assertEqual(_form_payload(form), {"a": "1", "b": None})
+
+    def test_soup_cached(self) -> None:
+        response = _response(b"<p>page</p>")
+        self.assertIs(_soup(response), _soup(response))
+
+    def test_find_inputs(self) -> None:
+        response = _response(
+            b'<input name="RelayState" value="r1"><input name="other" value="o">'
+            b'<input name="SAMLRequest" value="s"><input name="RelayState" value="r2">'
+        )
+        inputs = _find_inputs(response, "SAMLRequest", "RelayState", "SAMLResponse")
+        self.assertEqual(
+            {name: input_["value"] for name, input_ in inputs.items()},
+            {"SAMLRequest": "s", "RelayState": "r1"},
+        )
+
+    def test_find_inputs_encoding(self) -> None:
+        html = '<input name="SAMLResponse" value="vé">'.encode()
+        for content_type in ("text/html", "text/html; charset=bogus"):
+            with self.subTest(content_type):
+                inputs = _find_inputs(_response(html, content_type), "SAMLResponse")
+                self.assertEqual(inputs["SAMLResponse"]["value"], "vé")
+
+    def test_form_action(self) -> None:
+        response = _response(
+            b'<form action="/first"></form><form action="/second"></form>'
+        )
+        self.assertEqual(_form_action(response), "/first")
+
+    def test_retry_policy(self) -> None:
+        retry = _ADAPTER.max_retries
+        self.assertTrue(retry.is_retry("GET", 503))
+        self.assertFalse(retry.is_retry("POST", 503))
+        self.assertFalse(retry.is_retry("GET", 500))
+        self.assertFalse(retry.respect_retry_after_header)
+
+
 if __name__ == "__main__":
     logging.debug("Testing")
     unittest.main()
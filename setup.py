@@ -15,8 +15,11 @@ setuptools.setup(
     python_requires=">=3.7",
     install_requires=[
         "beautifulsoup4>=4.8.2",
+        "brotli>=1.0.9",
+        "lxml>=4.5.0",
         "pycryptodome>=3.9.4",
-        "requests>=2.22.0",
+        "requests>=2.26.0",
+        "urllib3>=1.26.0",
     ],
     classifiers=[
         "Programming Language :: Python :: 3",